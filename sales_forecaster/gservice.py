@@ -69,5 +69,5 @@ def upload_data_to_sheet(values, spreadsheet_id, sheet_name):
 
 def format_for_google_sheet_upload(df):
     headers = [list(df.columns.values)]
-    values = df.values.tolist()
+    values = df.astype(object).where(df.notnull(), None).values.tolist()
     return headers + values
@@ -43,14 +43,6 @@ def parse_orders(df):
     return df
 
 
-def parse_out_of_stock_days(df):
-    df['Year'] = pd.DatetimeIndex(df['End']).year.astype(int)
-    df['Month'] = pd.DatetimeIndex(df['End']).strftime('%B')
-    df['Day'] = pd.DatetimeIndex(df['End']).day.astype(int)
-
-    return df
-
-
 def parse_historical_table(df):
     try:
         df = df.astype({'Year': 'int'})
@@ -113,6 +105,43 @@ def read_out_of_stock_csv(filenames):
     return df
 
 
+def read_out_of_stock_periods(filenames):
+    df = pd.DataFrame(columns=['Market Place', 'ASIN', 'Out of stock days', 'Year', 'Month', 'Start', 'End', 'File'])
+    month_pattern = '|'.join(month_name[1:])
+    year_list = ["{0}".format(year) for year in range(2017, 2021)]
+    year_pattern = ' | '.join(year_list)
+
+    for file_number, filename in enumerate(filenames):
+        stock_out = pd.read_csv(filename)
+
+        # Reports with only the monthly total are left out, their days stay unknown.
+        if 'Start' not in stock_out.columns or 'End' not in stock_out.columns:
+            print('No out of stock periods in ', filename)
+            continue
+
+        stock_out = stock_out[['Market Place', 'ASIN', 'Out of stock days', 'Start', 'End']].copy()
+        stock_out['Out of stock days'] = pd.to_numeric(stock_out['Out of stock days'], errors='coerce')
+        stock_out['Start'] = pd.to_datetime(stock_out['Start']).dt.normalize()
+        stock_out['End'] = pd.to_datetime(stock_out['End']).dt.normalize()
+
+        month = re.search(month_pattern, filename, re.IGNORECASE).group(0).capitalize()
+        year = re.search(year_pattern, filename, re.IGNORECASE).group(0)
+
+        stock_out['Year'] = int(year)
+        stock_out['Month'] = month
+        stock_out['File'] = file_number
+
+        df = df.append(stock_out, ignore_index=True, sort=True)
+
+    # Same choice as read_out_of_stock_csv: one report per ASIN and month, the one with the least days.
+    df['Report'] = df.groupby(['File', 'Market Place', 'ASIN']).ngroup()
+    df = df.sort_values(by=['ASIN', 'Out of stock days'], kind='mergesort').reset_index(drop=True)
+    reports = df.drop_duplicates(subset=['Market Place', 'ASIN', 'Year', 'Month'], keep='first')['Report']
+    df = df[df['Report'].isin(reports)]
+
+    return df[['Market Place', 'ASIN', 'Year', 'Month', 'Start', 'End', 'Report']]
+
+
 def read_orders_csv(filenames):
     df = pd.DataFrame(columns=['Market Place', 'Year', 'Month', 'Day', 'ASIN',
                                'Price', 'Qty', 'Price/Qty', 'Sales Channel', 'Customer Pays'])
@@ -8,6 +8,7 @@ from datetime import datetime
 
 import parser
 import gservice
+import stock_status
 
 
 def get_liquidation_orders(orders_df, liquidataion_limit_df):
@@ -40,7 +41,8 @@ def add_out_of_stock_days(orders_df, out_of_stock_df):
             out_of_stock_df,
             how='left',
             on=['Cin7', 'Year', 'Month', 'Market Place'])
-        orders_with_out_of_stock_days.fillna(0, inplace=True)
+        orders_with_out_of_stock_days['Out of stock days'] = \
+            orders_with_out_of_stock_days['Out of stock days'].fillna(0)
 
         return orders_with_out_of_stock_days
     except KeyError:
@@ -48,8 +50,10 @@ def add_out_of_stock_days(orders_df, out_of_stock_df):
         return orders_df
 
 
-def format_calculations_for_output(df, cin7_product, out_of_stock, sales_channel, sales_type):
+def format_calculations_for_output(df, cin7_product, out_of_stock, sales_channel, sales_type, stock_status_index=None):
     output = add_out_of_stock_days(df, out_of_stock)
+    if stock_status_index is not None:
+        output = stock_status.add_daily_stock_status(output, stock_status_index)
 
     output = match_cin7_product(output, cin7_product)
 
@@ -70,9 +74,12 @@ def format_calculations_for_output(df, cin7_product, out_of_stock, sales_channel
         output['Date'] = pd.to_datetime(
             output['Year'].astype(str) + ' ' + output['Month'] + ' ' + output['Day'].astype(str),
             format='%Y %B %d').dt.strftime('%m/%d/%Y')
-        output = output[['Brand', 'Country', 'Sales Channel', 'Product Group', 'Cin7',
-                         'Sales Type', 'Date', 'Year', 'Month', 'Day', 'Qty',
-                         'Out of stock days', 'Price/Qty', 'Revenue']]
+        columns = ['Brand', 'Country', 'Sales Channel', 'Product Group', 'Cin7',
+                   'Sales Type', 'Date', 'Year', 'Month', 'Day', 'Qty',
+                   'Out of stock days', 'Price/Qty', 'Revenue']
+        if stock_status_index is not None:
+            columns.insert(columns.index('Out of stock days') + 1, 'In Stock')
+        output = output[columns]
 
     return output
 
@@ -95,6 +102,9 @@ def match_asin_cin7(df, asin_cin7_map, duplication_method):
             matched = matched.drop_duplicates(subset=['Market Place', 'Cin7', 'Year', 'Month'])
         elif duplication_method == 'sales':
             matched = matched.drop_duplicates()
+        elif duplication_method == 'out-of-stock-periods':
+            reports = matched.drop_duplicates(subset=['Market Place', 'Cin7', 'Year', 'Month'])['Report']
+            matched = matched[matched['Report'].isin(reports)].drop(['Report'], axis=1).drop_duplicates()
         elif duplication_method == 'orders':
             pass
 
@@ -138,6 +148,32 @@ def calculate_historical_table(df):
     return calc_historical
 
 
+def decompose_sales_types(total_df, sales_type_dfs):
+    key = ['Cin7', 'Market Place', 'Year', 'Month', 'Day']
+    try:
+        decomposed = total_df.sort_values(by=key).reset_index(drop=True)
+        key_index = pd.MultiIndex.from_frame(decomposed[key])
+    except KeyError:
+        print('Could not decompose the sales types.')
+        return total_df
+
+    residual_qty = decomposed['Qty'].values.astype(float)
+    for sales_type, sales_type_df in sales_type_dfs.items():
+        try:
+            sales_type_qty = sales_type_df.groupby(key)['Qty'].sum()
+            residual_qty = residual_qty - sales_type_qty.reindex(key_index, fill_value=0).values
+        except KeyError:
+            print('Could not match the {} orders with amazon orders.'.format(sales_type))
+
+    decomposed['Qty'] = residual_qty
+
+    negative_qty = decomposed[decomposed['Qty'] < 0]
+    if negative_qty.shape[0] > 0:
+        print('The decomposed Qty is negative for these orders:\n', negative_qty)
+
+    return decomposed[key + ['Qty', 'Price/Qty']]
+
+
 def sum_ppc_orders_by_product_group(df):
     qty_sum = df.groupby([
         'Market Place', 'Year', 'Month', 'Brand', 'Product Group'
@@ -279,6 +315,10 @@ def main(orders_regex, out_of_stock_regex, sales_regex, input_regex):
 
     out_of_stock = parser.read_out_of_stock_csv(stock_out_files)
     out_of_stock = match_asin_cin7(out_of_stock, asin_cin7, 'out-of-stock')
+    out_of_stock_periods = parser.read_out_of_stock_periods(stock_out_files)
+    out_of_stock_periods = match_asin_cin7(out_of_stock_periods, asin_cin7, 'out-of-stock-periods')
+    stock_status_index = stock_status.build_stock_status_index(out_of_stock_periods)
+    stock_status.check_out_of_stock_days(out_of_stock, stock_status_index)
 
     sales = parser.read_sales_xlsx(sales_files)
     sales = match_asin_cin7(sales, asin_cin7, 'sales')
@@ -298,38 +338,10 @@ def main(orders_regex, out_of_stock_regex, sales_regex, input_regex):
     calc_historical_non_amazon = calculate_historical_table(orders_non_amazon)
     calc_historical_amazon = calculate_historical_table(orders_amazon)
 
-    try:
-        calc_historical_ppc_organic = pd.merge(calc_historical_amazon, calc_historical_liquidation,
-                                               how='left',
-                                               on=['Cin7', 'Market Place', 'Year', 'Month', 'Day'],
-                                               suffixes=('_amazon', '_liquidation'))
-        calc_historical_ppc_organic.fillna(0, inplace=True)
-        calc_historical_ppc_organic['Qty'] = calc_historical_ppc_organic['Qty_amazon'] \
-                                             - calc_historical_ppc_organic['Qty_liquidation']
-        calc_historical_ppc_organic['Price/Qty'] = calc_historical_ppc_organic['Price/Qty_amazon']
-        calc_historical_ppc_organic = calc_historical_ppc_organic.loc[:,
-                                      ~calc_historical_ppc_organic.columns.str.endswith('_amazon')]
-        calc_historical_ppc_organic = calc_historical_ppc_organic.loc[:,
-                                      ~calc_historical_ppc_organic.columns.str.endswith('_liquidation')]
-    except KeyError:
-        print('Could not match the liquidation orders with amazon orders.')
-        calc_historical_ppc_organic = calc_historical_amazon
-
-    try:
-        calc_historical_ppc_organic = pd.merge(calc_historical_ppc_organic, promotions,
-                                               how='left',
-                                               on=['Cin7', 'Market Place', 'Year', 'Month', 'Day'],
-                                               suffixes=('_amazon', '_promotion'))
-        calc_historical_ppc_organic.fillna(0, inplace=True)
-        calc_historical_ppc_organic['Qty'] = calc_historical_ppc_organic['Qty_amazon'] \
-                                             - calc_historical_ppc_organic['Qty_promotion']
-        calc_historical_ppc_organic['Price/Qty'] = calc_historical_ppc_organic['Price/Qty_amazon']
-        calc_historical_ppc_organic = calc_historical_ppc_organic.loc[:,
-                                      ~calc_historical_ppc_organic.columns.str.endswith('_amazon')]
-        calc_historical_ppc_organic = calc_historical_ppc_organic.loc[:,
-                                      ~calc_historical_ppc_organic.columns.str.endswith('_promotion')]
-    except KeyError:
-        print('Could not match the promotion orders with amazon orders.')
+    calc_historical_ppc_organic = decompose_sales_types(calc_historical_amazon, {
+        'liquidation': calc_historical_liquidation,
+        'promotion': promotions,
+    })
 
     calc_historical_ppc_organic = match_cin7_product(calc_historical_ppc_organic, cin7_product)
     calc_orders_portion = calculate_ppc_portions(calc_historical_ppc_organic)
@@ -365,10 +377,10 @@ def main(orders_regex, out_of_stock_regex, sales_regex, input_regex):
                                                      'Out of stock days', 'Avg Sale Price', 'Revenue']]
 
     calc_historical_amazon_formatted = format_calculations_for_output(
-        calc_historical_amazon, cin7_product, out_of_stock, 'Amazon', ''
+        calc_historical_amazon, cin7_product, out_of_stock, 'Amazon', '', stock_status_index
     )
     calc_historical_liquidation_formatted = format_calculations_for_output(
-        calc_historical_liquidation, cin7_product, out_of_stock, 'Amazon', 'Liquidation'
+        calc_historical_liquidation, cin7_product, out_of_stock, 'Amazon', 'Liquidation', stock_status_index
     )
     calc_historical_non_amazon_formatted = format_calculations_for_output(
         calc_historical_non_amazon, cin7_product, out_of_stock, 'Non-Amazon', ''
@@ -380,7 +392,12 @@ def main(orders_regex, out_of_stock_regex, sales_regex, input_regex):
         calc_historical_organic, cin7_product, out_of_stock, 'Amazon', 'Organic'
     )
     calc_historical_total_sales_formatted = pd.concat(
-        [calc_historical_amazon_formatted, calc_historical_non_amazon_formatted], ignore_index=True)
+        [calc_historical_amazon_formatted.drop(['In Stock'], axis=1), calc_historical_non_amazon_formatted],
+        ignore_index=True, sort=False)
+    calc_historical_total_sales_formatted = calc_historical_total_sales_formatted[[
+        'Brand', 'Country', 'Sales Channel', 'Product Group', 'Cin7',
+        'Sales Type', 'Date', 'Year', 'Month', 'Day', 'Qty',
+        'Out of stock days', 'Price/Qty', 'Revenue']]
 
     with pd.ExcelWriter('calculations.xlsx') as writer:
         calc_historical_total_sales_formatted.to_excel(writer, sheet_name='Calc-Historical-Total')
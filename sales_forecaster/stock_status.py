@@ -0,0 +1,118 @@
+from collections import namedtuple
+import pandas as pd
+import numpy as np
+
+# keys:         MultiIndex of (Cin7, Market Place), one row of the prefix counts per key
+# start:        first day of the calendar as datetime64[D]
+# out_of_stock: out_of_stock[row, d] is the number of out-of-stock days before calendar day d
+# covered:      covered[row, d] is the number of days before calendar day d that a report describes
+StockStatusIndex = namedtuple('StockStatusIndex', ['keys', 'start', 'out_of_stock', 'covered'])
+
+
+def _mark_days(shape, rows, first_days, last_days):
+    # Difference array over the calendar, so that overlapping ranges are only counted once.
+    marks = np.zeros((shape[0], shape[1] + 1), dtype=np.int32)
+    np.add.at(marks, (rows, first_days), 1)
+    np.add.at(marks, (rows, last_days + 1), -1)
+    marked = np.cumsum(marks[:, :shape[1]], axis=1) > 0
+
+    prefix = np.zeros((shape[0], shape[1] + 1), dtype=np.uint16)
+    prefix[:, 1:] = np.cumsum(marked, axis=1)
+    return prefix
+
+
+def build_stock_status_index(periods_df):
+    if periods_df.shape[0] == 0:
+        return StockStatusIndex(pd.MultiIndex.from_arrays([[], []], names=['Cin7', 'Market Place']),
+                                np.datetime64('1970-01-01', 'D'),
+                                np.zeros((0, 1), dtype=np.uint16),
+                                np.zeros((0, 1), dtype=np.uint16))
+
+    keys = pd.MultiIndex.from_frame(periods_df[['Cin7', 'Market Place']].drop_duplicates())
+    rows = keys.get_indexer(pd.MultiIndex.from_frame(periods_df[['Cin7', 'Market Place']]))
+
+    month_start = pd.to_datetime(periods_df['Year'].astype(str) + ' ' + periods_df['Month'].astype(str),
+                                 format='%Y %B')
+    month_end = (month_start + pd.offsets.MonthEnd(0)).values.astype('datetime64[D]')
+    month_start = month_start.values.astype('datetime64[D]')
+    start = month_start.min()
+    shape = (len(keys), int((month_end.max() - start).astype(int)) + 1)
+
+    covered = _mark_days(shape, rows, (month_start - start).astype(int), (month_end - start).astype(int))
+
+    # Each report only describes its own month, periods reaching outside of it are cut.
+    has_period = (periods_df['Start'].notnull() & periods_df['End'].notnull()).values
+    period_start = np.maximum(pd.to_datetime(periods_df['Start']).values.astype('datetime64[D]'), month_start)
+    period_end = np.minimum(pd.to_datetime(periods_df['End']).values.astype('datetime64[D]'), month_end)
+    in_month = has_period & (period_start <= period_end)
+    out_of_stock = _mark_days(shape, rows[in_month],
+                              (period_start[in_month] - start).astype(int),
+                              (period_end[in_month] - start).astype(int))
+
+    return StockStatusIndex(keys, start, out_of_stock, covered)
+
+
+def count_out_of_stock_days(index, cin7, market_place, start_date, end_date):
+    dates = pd.to_datetime([start_date, end_date]).values.astype('datetime64[D]')
+    if dates[1] < dates[0]:
+        return 0
+
+    try:
+        row = index.keys.get_loc((cin7, market_place))
+    except KeyError:
+        return np.nan
+
+    first, last = (dates - index.start).astype(int)
+    last += 1
+    if first < 0 or last >= index.covered.shape[1] or index.covered[row, last] - index.covered[row, first] < last - first:
+        return np.nan
+
+    return int(index.out_of_stock[row, last]) - int(index.out_of_stock[row, first])
+
+
+def check_out_of_stock_days(out_of_stock_df, index):
+    try:
+        month_start = pd.to_datetime(out_of_stock_df['Year'].astype(str) + ' ' + out_of_stock_df['Month'].astype(str),
+                                     format='%Y %B')
+        month_end = month_start + pd.offsets.MonthEnd(0)
+        counted = [count_out_of_stock_days(index, cin7, market_place, first, last)
+                   for cin7, market_place, first, last
+                   in zip(out_of_stock_df['Cin7'], out_of_stock_df['Market Place'], month_start, month_end)]
+
+        checked = out_of_stock_df.copy()
+        checked['Counted out of stock days'] = counted
+        mismatched = checked[checked['Counted out of stock days'].notnull() &
+                             (checked['Counted out of stock days'] != pd.to_numeric(checked['Out of stock days'],
+                                                                                    errors='coerce'))]
+        if mismatched.shape[0] > 0:
+            print('Out of stock days do not match the out of stock periods for these products:\n', mismatched)
+
+        return mismatched
+    except KeyError:
+        print('Could not check the out of stock days.')
+        return pd.DataFrame()
+
+
+def add_daily_stock_status(df, index):
+    try:
+        rows = index.keys.get_indexer(pd.MultiIndex.from_arrays([df['Cin7'], df['Market Place']]))
+        dates = pd.to_datetime(
+            df['Year'].astype(str) + ' ' + df['Month'].astype(str) + ' ' + df['Day'].astype(str),
+            format='%Y %B %d').values.astype('datetime64[D]')
+
+        offsets = (dates - index.start).astype(int)
+        known = (rows >= 0) & (offsets >= 0) & (offsets < index.covered.shape[1] - 1)
+        known[known] = index.covered[rows[known], offsets[known] + 1] > index.covered[rows[known], offsets[known]]
+
+        # Days that no report describes stay unknown (NaN).
+        in_stock = np.full(df.shape[0], np.nan)
+        out_of_stock = index.out_of_stock[rows[known], offsets[known] + 1] - \
+            index.out_of_stock[rows[known], offsets[known]]
+        in_stock[known] = 1 - out_of_stock.astype(int)
+
+        df = df.copy()
+        df['In Stock'] = in_stock
+        return df
+    except KeyError:
+        print('Could not add the daily stock status.')
+        return df